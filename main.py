@@ -1,161 +1,361 @@
 import argparse
+import asyncio
+import csv
 import itertools
 import json
+import multiprocessing as mp
+import os
 import re
 import time
 from datetime import datetime
 from pathlib import Path
 
+import aiofiles
+import aiohttp
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import requests
-from bs4 import BeautifulSoup
 from more_itertools import grouper
+from requests.adapters import HTTPAdapter
+from selectolax.lexbor import LexborHTMLParser
 from tqdm import tqdm
-
-_RE_PERC = re.compile(r"(?<!(\-|\+|\())\d{1,3}\.\d{2}\%")
+from urllib3.util.retry import Retry
+
+_RE_PERC = re.compile(r"(?<![-+(])(\d{1,3}\.\d{2})\%")
+_RE_CAPSULE = re.compile("capsule|capcontent")
+_RE_CAT_DETAILS = re.compile(r"(cat\d{1,}|osversion)_details")
+_RE_CAT_ROW = re.compile(r"(cat\d{1,}|osversion)_stats_row")
+_RE_STATS_COL = re.compile(r"stats_col_(left|left_holder|mid|mid_details|right)\b")
+_RE_CAT_CLEAN = re.compile(r"\s{1,}\(.+(?<!total)\).*$")
 _RETRY_SLEEP = 5
-
-
-def build_metadata(subset="combined", reset_file=False, year_start=2004, year_end=2022):
+_MAX_RETRIES = 5
+_MAX_CONCURRENCY = 8
+_WAYBACK_URL = "http://archive.org/wayback/available"
+_METADATA_COLS = ["date_code", "archive_url", "file_name"]
+_METADATA_BATCH = 20
+_SURVEY_SCHEMA = pa.schema(
+    [
+        ("date_code", pa.string()),
+        ("category", pa.string()),
+        ("index", pa.string()),
+        ("perc", pa.float64()),
+    ]
+)
+_OUTPUT_SCHEMA = pa.schema(
+    [
+        ("index", pa.string()),
+        ("perc", pa.float64()),
+        ("category", pa.dictionary(pa.int32(), pa.string())),
+        ("date", pa.timestamp("ns")),
+        ("platform", pa.dictionary(pa.int32(), pa.string())),
+    ]
+)
+
+# keep-alive connection pool shared by the synchronous requests
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=_MAX_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+    ),
+)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+
+
+async def _query_month(session, sem, queue, idx, date_code, url):
+    """Find the snapshot closest to mid-month and push its metadata to the queue."""
+    # query for mid-month to avoid getting snapshots for the next or previous month
+    payload = {"url": url, "timestamp": f"{date_code}15"}
+    r_snapshot = None
+    async with sem:
+        for num_retry in range(_MAX_RETRIES):
+            try:
+                async with session.get(_WAYBACK_URL, params=payload) as r:
+                    r.raise_for_status()
+                    r_snapshot = (await r.json())["archived_snapshots"].get("closest")
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if num_retry == _MAX_RETRIES - 1:
+                    raise
+            if r_snapshot or num_retry == _MAX_RETRIES - 1:
+                break
+            await asyncio.sleep(_RETRY_SLEEP * 2**num_retry)
+        if r_snapshot:
+            await asyncio.sleep(_RETRY_SLEEP)
+
+    # months with no snapshot after all retries are left out, to query them again
+    if r_snapshot is None:
+        await queue.put((idx, None, payload["timestamp"], None))
+        return
+
+    # check the snapshot is from the month and year we want
+    payload_ts = datetime.strptime(payload["timestamp"], "%Y%m%d")
+    snapshot_ts = datetime.strptime(r_snapshot["timestamp"], "%Y%m%d%H%M%S")
+    if (payload_ts.month == snapshot_ts.month) & (payload_ts.year == snapshot_ts.year):
+        new_data = [date_code, r_snapshot["url"], f"{r_snapshot['timestamp']}.txt"]
+    else:
+        new_data = [date_code, None, None]
+    await queue.put((idx, new_data, payload["timestamp"], r_snapshot["timestamp"]))
+
+
+def _append_metadata(metadata_path, rows):
+    """Append a batch of snapshot rows to the metadata file."""
+    with open(metadata_path, "a", newline="") as f:
+        csv.writer(f, lineterminator="\n").writerows(rows)
+    rows.clear()
+
+
+async def _write_metadata(queue, metadata_path, num_items):
+    """Append the queried snapshots to the metadata file in chronological order."""
+    pending = {}
+    next_idx = 0
+    rows = []
+    try:
+        for _ in (pbar := tqdm(range(num_items))):
+            idx, new_data, query_ts, snapshot_ts = await queue.get()
+            pending[idx] = new_data
+            while next_idx in pending:
+                new_data = pending.pop(next_idx)
+                next_idx += 1
+                if new_data is not None:
+                    rows.append(new_data)
+            # add retrieved snapshots to keep track of the downloaded periods
+            if len(rows) >= _METADATA_BATCH:
+                _append_metadata(metadata_path, rows)
+            pbar.set_postfix({"query": query_ts, "snaphsot": snapshot_ts})
+    finally:
+        # keep whatever was retrieved if the run is interrupted
+        _append_metadata(metadata_path, rows)
+
+
+async def build_metadata(
+    subset="combined", reset_file=False, year_start=2004, year_end=2022
+):
     """Find a snapshot link for each month and save it in a metadata file."""
     metadata_path = Path.cwd() / f"metadata_{subset}.csv"
-    df_cols = ["date_code", "archive_url", "file_name"]
     if not metadata_path.exists() or reset_file:
-        df = pd.DataFrame(list(), columns=df_cols)
+        df = pd.DataFrame(list(), columns=_METADATA_COLS)
         df.to_csv(metadata_path, index=False)
     metadata = pd.read_csv(metadata_path, dtype=str)
-    payload = {"url": None, "timestamp": None}
+    seen = set(metadata["date_code"].dropna())
     base_url_platform = "https://store.steampowered.com/hwsurvey?platform="
 
-    for year, month in (
-        pbar := tqdm(itertools.product(range(year_start, year_end), range(1, 13)))
-    ):
+    queries = []
+    for year, month in itertools.product(range(year_start, year_end), range(1, 13)):
         date_code = f"{year}{month:02d}"
-        num_retry = 1
-        if metadata["date_code"].isin([date_code]).any():
-            # url_available = metadata.loc[
-            #     metadata["date_code"] == date_code, "archive_url"
-            # ].to_numpy()[0]
+        if date_code in seen:
             continue
 
         if year < 2009 and subset == "combined":
-            payload.update({"url": "http://www.steampowered.com/status/survey.html"})
+            url = "http://www.steampowered.com/status/survey.html"
         elif subset == "combined":
-            payload.update({"url": "https://store.steampowered.com/hwsurvey"})
-        else:
-            payload.update({"url": f"{base_url_platform}{subset}"})
-
-        # query for mid-month to avoid getting snapshots for the next or previous month
-        payload.update({"timestamp": f"{date_code}15"})
-        # TODO: implement retry procedure
-        r = requests.get("http://archive.org/wayback/available", params=payload)
-        while not r.json()["archived_snapshots"]:
-            time.sleep(_RETRY_SLEEP * num_retry)
-            r = requests.get("http://archive.org/wayback/available", params=payload)
-            num_retry += 1
-
-        r_snapshot = r.json()["archived_snapshots"]["closest"]
-
-        # check the snapshot is from the month and year we want
-        payload_ts = datetime.strptime(payload["timestamp"], "%Y%m%d")
-        snapshot_ts = datetime.strptime(r_snapshot["timestamp"], "%Y%m%d%H%M%S")
-        if (payload_ts.month == snapshot_ts.month) & (
-            payload_ts.year == snapshot_ts.year
-        ):
-            new_data = [date_code, r_snapshot["url"], f"{r_snapshot['timestamp']}.txt"]
+            url = "https://store.steampowered.com/hwsurvey"
         else:
-            new_data = [date_code, None, None]
-
-        # add retrieved snapshots to keep track of the downloaded periods
-        curr_df = pd.DataFrame([new_data], columns=df_cols)
-        curr_df.to_csv(metadata_path, mode="a", index=False, header=False)
-        pbar.set_postfix(
-            {"query": payload["timestamp"], "snaphsot": r_snapshot["timestamp"]}
+            url = f"{base_url_platform}{subset}"
+        queries.append((date_code, url))
+
+    # a single writer keeps the appends to the metadata file ordered
+    queue = asyncio.Queue()
+    sem = asyncio.Semaphore(_MAX_CONCURRENCY)
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(
+            _write_metadata(queue, metadata_path, len(queries)),
+            *[
+                _query_month(session, sem, queue, idx, date_code, url)
+                for idx, (date_code, url) in enumerate(queries)
+            ],
         )
-        time.sleep(_RETRY_SLEEP)
 
 
-def download_web_content(save_path, subset="combined", overwrite=False):
+async def _fetch_content(session, sem, row, file_path):
+    """Download a snapshot to a local file, with exponential backoff on errors."""
+    # send the cache validators of a previous download, to skip unchanged content
+    meta_path = file_path.with_name(f"{file_path.name}.meta")
+    headers = {}
+    if file_path.exists() and meta_path.exists():
+        try:
+            validators = json.loads(meta_path.read_text())
+        except ValueError:
+            # an unreadable sidecar just means a full download
+            validators = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    async with sem:
+        for num_retry in range(_MAX_RETRIES):
+            try:
+                async with session.get(row.archive_url, headers=headers) as r:
+                    r.raise_for_status()
+                    modified = r.status != 304
+                    content = await r.text() if modified else None
+                    validators = {
+                        "etag": r.headers.get("ETag"),
+                        "last_modified": r.headers.get("Last-Modified"),
+                    }
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if num_retry == _MAX_RETRIES - 1:
+                    raise
+                await asyncio.sleep(_RETRY_SLEEP * 2**num_retry)
+        if modified:
+            # save content to local for faster iteration and testing, writing to a
+            # temporary file first so an interrupted run never leaves a truncated page
+            part_path = file_path.with_name(f"{file_path.name}.part")
+            async with aiofiles.open(part_path, "w", encoding="utf-8") as f:
+                await f.write(content)
+            os.replace(part_path, file_path)
+            meta_part_path = meta_path.with_name(f"{meta_path.name}.part")
+            async with aiofiles.open(meta_part_path, "w") as f:
+                await f.write(json.dumps(validators))
+            os.replace(meta_part_path, meta_path)
+            await asyncio.sleep(3)
+    return row
+
+
+async def download_web_content(save_path, subset="combined", overwrite=False):
     """Save the webpage content to a local file for faster inspection and iteration"""
     metadata = pd.read_csv(Path.cwd() / f"metadata_{subset}.csv")
     content_path = save_path / subset
     if not content_path.exists():
         content_path.mkdir(parents=True)
 
-    for row in (pbar := tqdm(metadata.itertuples(), total=metadata.shape[0])):
-        if pd.isna(row.archive_url):
-            continue
-        if not (content_path / row.file_name).exists() or overwrite:
-            r = requests.get(row.archive_url)
-            # save content to local for faster iteration and testing
-            with open(content_path / row.file_name, "w") as f:
-                f.write(r.text)
-            pbar.set_postfix({"date_code": row.date_code, "subset": subset})
-            time.sleep(3)
-
-
-def old_parser(soup, agg_ram=False):
+    # log of completed downloads, to resume from the last saved file
+    done_path = content_path / ".done"
+    if not done_path.exists():
+        # seed the log once with pages saved before it existed
+        done_path.write_text(
+            "".join(
+                f"{path.name}\n"
+                for path in sorted(content_path.iterdir())
+                if path.is_file() and path.suffix not in (".part", ".meta")
+            )
+        )
+    done = set(done_path.read_text().split())
+
+    sem = asyncio.Semaphore(_MAX_CONCURRENCY)
+    connector = aiohttp.TCPConnector(limit_per_host=_MAX_CONCURRENCY)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        tasks = [
+            _fetch_content(session, sem, row, content_path / row.file_name)
+            for row in metadata.itertuples()
+            if not pd.isna(row.archive_url)
+            and (row.file_name not in done or overwrite)
+        ]
+        with open(done_path, "a") as f:
+            for task in (pbar := tqdm(asyncio.as_completed(tasks), total=len(tasks))):
+                row = await task
+                f.write(f"{row.file_name}\n")
+                f.flush()
+                pbar.set_postfix({"date_code": row.date_code, "subset": subset})
+
+
+def _match_class(node, pattern):
+    """Check if any of the node classes matches the pattern."""
+    return any(pattern.search(c) for c in (node.attributes["class"] or "").split())
+
+
+def old_parser(tree, agg_ram=False):
     """Retrieve information from the different categories with old web style."""
     data_json = {}
-    cat_tree = soup.find_all("div", class_=re.compile("capsule|capcontent"))
-    for tree in cat_tree:
-        name = tree.find("b")
-        data_json[name.text.strip()] = {}
-
-        content = tree.find("table").find_all("td", {"align": "right"})
-        cols = 4 if name.text.strip() == "RAM" and agg_ram else 3
+    cat_tree = [
+        node for node in tree.css("div[class]") if _match_class(node, _RE_CAPSULE)
+    ]
+    for node in cat_tree:
+        cat_name = node.css_first("b").text().strip()
+        data_json[cat_name] = {}
+
+        content = node.css_first("table").css('td[align="right"]')
+        cols = 4 if cat_name == "RAM" and agg_ram else 3
         for left, mid, *right in grouper(content, cols, fillvalue=None):
-            item = left.text.strip()
+            item = left.text().strip()
             right, *_ = right
-            value = float(right.text.strip("%"))
-            data_json[name.text.strip()][item] = value
+            value = float(right.text().strip("%"))
+            data_json[cat_name][item] = value
     return data_json
 
 
-def modern_parser(soup):
+def _item_category(data_json, cat_name, item):
+    """Select the category of an item, building an extra category for aggregates."""
+    if item not in ("Windows", "OSX", "Linux"):
+        return cat_name
+    # 'Windows' category is the only one to init the dict
+    if item == "Windows":
+        data_json.setdefault("OS Version (total)", {})
+        return "OS Version (total)"
+    # sometimes Linux appears as a distro instead of an aggregate
+    return "OS Version (total)" if "OS Version (total)" in data_json else cat_name
+
+
+def modern_parser(tree):
     """Retrieve information from the different categories with present web style."""
     data_json = {}
-    cat_tree = soup.find_all(
-        "div", {"id": re.compile(r"(cat\d{1,}|osversion)_details")}
-    )
-    cat_title = soup.find_all(
-        "div",
-        {
-            "id": re.compile(r"(cat\d{1,}|osversion)_stats_row"),
-            "onclick": re.compile("toggleRow(.+)"),
-        },
+    perc_search = _RE_PERC.search
+    # walk the document once, splitting category titles and details by their id
+    cat_tree, cat_title = [], []
+    cat_nodes = tree.css(
+        'div[id*="_details"], div[id*="_stats_row"][onclick*="toggleRow"]'
     )
-    for tree, title in zip(cat_tree, cat_title):
-        name = title.find("div", class_="stats_col_left")
-        data_json[name.text.strip()] = {}
-
-        cat_class = re.compile(r"stats_col_(left|left_holder|mid|mid_details|right)\b")
-        cat_groups = grouper(tree.find_all("div", class_=cat_class), 3, fillvalue=None)
+    for node in cat_nodes:
+        if _RE_CAT_DETAILS.search(node.attributes["id"]):
+            cat_tree.append(node)
+        elif _RE_CAT_ROW.search(node.attributes["id"]):
+            cat_title.append(node)
+    for node, title in zip(cat_tree, cat_title):
+        cat_name = title.css_first("div.stats_col_left").text().strip()
+        data_json[cat_name] = {}
+
+        # match all the columns at once to keep them in document order
+        cat_cols = [x for x in node.css("div[class]") if _match_class(x, _RE_STATS_COL)]
+        cat_groups = grouper(cat_cols, 3, fillvalue=None)
         for left, mid, right in cat_groups:
-            item = left.text.strip() if left.text.strip() else mid.text.strip()
-            value = re.search(_RE_PERC, right.text)
-            value = float(value.group(0).strip("%"))
-            # build extra category for aggregates
-            if item in ["Windows", "OSX", "Linux"]:
-                # sometimes Linux appears as a distro instead of an aggregate
-                # 'Windows' category is the only one to init the dict
-                if item == "Windows":
-                    if "OS Version (total)" not in data_json:
-                        data_json["OS Version (total)"] = {}
-                    data_json["OS Version (total)"][item] = value
-                else:
-                    if "OS Version (total)" not in data_json:
-                        data_json[name.text.strip()][item] = value
-                    else:
-                        data_json["OS Version (total)"][item] = value
+            item = left.text().strip() or mid.text().strip()
+            right_text = right.text().strip()
+            # most cells only hold the percentage, avoid the regex for those, but let
+            # signed deltas and other float() literals go through _RE_PERC
+            number = right_text.rstrip("%")
+            if number[:1].isdigit() and number.replace(".", "", 1).isdigit():
+                value = float(number)
             else:
-                data_json[name.text.strip()][item] = value
+                value = float(perc_search(right_text).group(1))
+            data_json[_item_category(data_json, cat_name, item)][item] = value
     return data_json
 
 
+def _parse_one(args):
+    """Parse a single snapshot file, selecting the parser for its date."""
+    file_path, year, month, date_code = args
+    data = file_path.read_bytes()
+    tree = LexborHTMLParser(data)
+    data_dict = {}
+    if (year == 2008 and month == 12) or year > 2008:
+        data_dict = modern_parser(tree)
+    else:
+        # during this period a 4th column with aggregate data is added for the "RAM" category
+        agg_ram = True if year == 2005 and month > 7 else False
+        data_dict = old_parser(tree, agg_ram)
+    return date_code, data_dict
+
+
+def _survey_table(data_dict, date_code):
+    """Flatten the parsed categories of a snapshot into a long-form table."""
+    survey_data = {name: [] for name in _SURVEY_SCHEMA.names}
+    for cat, items in data_dict.items():
+        for item, value in items.items():
+            survey_data["date_code"].append(date_code)
+            survey_data["category"].append(cat)
+            survey_data["index"].append(item)
+            survey_data["perc"].append(value)
+    return pa.table(survey_data, schema=_SURVEY_SCHEMA)
+
+
 def parse_data_content(save_path, subset="combined"):
-    """Parse and extract file contents and save them in a JSON file."""
-    steam_hw_survey = []
+    """Parse and extract file contents and save them in a Feather file."""
     metadata = pd.read_csv(Path.cwd() / f"metadata_{subset}.csv", dtype=str)
     metadata = metadata.dropna(subset=["file_name"])
     metadata["date"] = pd.to_datetime(metadata["date_code"], format="%Y%m")
@@ -163,60 +363,33 @@ def parse_data_content(save_path, subset="combined"):
     metadata["month"] = metadata["date"].dt.month
     content_path = save_path / subset
 
-    for row in (pbar := tqdm(metadata.itertuples(), total=metadata.shape[0])):
-        data = open(content_path / row.file_name).read()
-        soup = BeautifulSoup(data, "html.parser")
-        data_dict = {}
-        if (row.year == 2008 and row.month == 12) or row.year > 2008:
-            data_dict = modern_parser(soup)
-        else:
-            # during this period a 4th column with aggregate data is added for the "RAM" category
-            agg_ram = True if row.year == 2005 and row.month > 7 else False
-            data_dict = old_parser(soup, agg_ram)
-        if data_dict:
-            data_dict["date_code"] = row.date_code
-            steam_hw_survey.append(data_dict)
-        pbar.set_postfix({"date_code": row.date_code, "subset": subset})
-    with open(Path.cwd() / f"survey_data_{subset}.json", "w") as f:
-        json.dump(steam_hw_survey, f, indent=2)
-
-
-def clean_and_normalize(subset="combined"):
-    df_list = []
-    data_path = Path.cwd() / f"survey_data_{subset}.json"
-    if not data_path.exists():
-        raise f"{data_path}: file not found, check you have parsed the content for this subset and the JSON file exists."
-
-    with open(data_path) as f:
-        data = json.loads(f.read())
-
-    for item in (pbar := tqdm(data)):
-        pbar.set_postfix({"date_code": item["date_code"], "subset": subset})
-        for cat in item.keys():
-            if cat not in ["date_code"]:
-                cat_data = itertools.zip_longest(
-                    list(item[cat].values()), [cat], fillvalue=cat
-                )
-                df = json.dumps(
-                    {
-                        "columns": ["perc", "category"],
-                        "index": list(item[cat].keys()),
-                        "data": list(cat_data),
-                    }
-                )
-                df = pd.read_json(df, orient="split")
-                df["date"] = datetime.strptime(str(item["date_code"]), "%Y%m")
-                df["platform"] = subset
-                df_list.append(df)
-    df = pd.concat(df_list, axis=0)
-    df.reset_index(inplace=True)
+    tasks = [
+        (content_path / row.file_name, row.year, row.month, row.date_code)
+        for row in metadata.itertuples()
+    ]
+    # files are independent, parse them in parallel keeping the metadata order,
+    # and write each month as its own record batch to a temporary file, so a
+    # failed run keeps the previous complete output
+    data_path = Path.cwd() / f"survey_data_{subset}.feather"
+    part_path = data_path.with_name(f"{data_path.name}.part")
+    with mp.Pool() as pool, pa.ipc.new_file(part_path, _SURVEY_SCHEMA) as writer:
+        results = pool.imap(_parse_one, tasks, chunksize=8)
+        for date_code, data_dict in (pbar := tqdm(results, total=len(tasks))):
+            if data_dict:
+                writer.write_table(_survey_table(data_dict, date_code))
+            pbar.set_postfix({"date_code": date_code, "subset": subset})
+    os.replace(part_path, data_path)
+
+
+def _clean_survey(df, subset):
+    """Clean and normalize a batch of survey data."""
+    df["date"] = pd.to_datetime(df.pop("date_code"), format="%Y%m")
+    df["platform"] = subset
+    df = df[_OUTPUT_SCHEMA.names]
 
     # clean category titles
-    df["category"] = df["category"].replace(
-        to_replace=r"\s{1,}\(.+(?<!total)\).*$", value="", regex=True
-    )
-    df["category"] = df["category"].astype("category")
-    df["index"] = df["index"].replace(to_replace=r"\&lt", value="<", regex=True)
+    df["category"] = df["category"].str.replace(_RE_CAT_CLEAN, "", regex=True)
+    df["index"] = df["index"].str.replace("&lt", "<", regex=False)
 
     # rename categories for consistency
     cat_rename = {
@@ -233,10 +406,46 @@ def clean_and_normalize(subset="combined"):
     if subset=="combined":
         df.loc[df["date"] < "2010-06-01", "platform"] = "pc"
     df["platform"] = df["platform"].astype("category")
+    return df
+
+
+def clean_and_normalize(subset="combined"):
+    data_path = Path.cwd() / f"survey_data_{subset}.feather"
+    if not data_path.exists():
+        raise FileNotFoundError(
+            f"{data_path}: file not found, check you have parsed the content for this subset and the Feather file exists."
+        )
+
+    # stream each month from the Feather file to its own Parquet row group
+    output_path = Path.cwd() / f"steam_hw_survey_{subset}.parquet"
+    part_path = output_path.with_name(f"{output_path.name}.part")
+    categories = {"category": set(), "platform": set()}
+    with pa.memory_map(str(data_path)) as source:
+        reader = pa.ipc.open_file(source)
+        with pq.ParquetWriter(part_path, _OUTPUT_SCHEMA) as writer:
+            for i in (pbar := tqdm(range(reader.num_record_batches))):
+                df = _clean_survey(reader.get_batch(i).to_pandas(), subset)
+                for col, values in categories.items():
+                    values.update(df[col].cat.categories)
+                table = pa.Table.from_pandas(df, _OUTPUT_SCHEMA, preserve_index=False)
+                writer.write_table(table)
+                if not df.empty:
+                    date_code = df["date"].iat[0].strftime("%Y%m")
+                    pbar.set_postfix({"date_code": date_code, "subset": subset})
+
+    # each row group gets its own dictionary in first seen order, rewrite them
+    # sharing the sorted categories so they read back sorted
+    categories = {col: sorted(values) for col, values in categories.items()}
+    part_file = pq.ParquetFile(part_path)
+    with pq.ParquetWriter(output_path, _OUTPUT_SCHEMA) as writer:
+        for i in range(part_file.num_row_groups):
+            df = part_file.read_row_group(i).to_pandas()
+            for col, values in categories.items():
+                df[col] = df[col].cat.set_categories(values)
+            table = pa.Table.from_pandas(df, _OUTPUT_SCHEMA, preserve_index=False)
+            writer.write_table(table)
+    part_path.unlink()
 
-    # df.to_csv(f"steam_hw_survey_{subset}.csv", index=False)
-    df.to_parquet(f"steam_hw_survey_{subset}.parquet", index=False)
-    
 
 def parse_current_month(subset="combined"):
     if subset == "combined":
@@ -245,15 +454,15 @@ def parse_current_month(subset="combined"):
         payload = {"platform": subset}
     base_url = "https://store.steampowered.com/hwsurvey"
         
-    r = requests.get(base_url, params=payload)
-    soup = BeautifulSoup(r.text, "html.parser")
-    data_dict = modern_parser(soup)
-    steam_hw_survey = []
-    if data_dict:
-        data_dict["date_code"] = datetime.today().strftime("%Y%m")
-        steam_hw_survey.append(data_dict)
-    with open(Path.cwd() / f"survey_data_{subset}.json", "w") as f:
-        json.dump(steam_hw_survey, f, indent=2)
+    r = _SESSION.get(base_url, params=payload, timeout=30)
+    tree = LexborHTMLParser(r.text)
+    data_dict = modern_parser(tree)
+    data_path = Path.cwd() / f"survey_data_{subset}.feather"
+    with pa.ipc.new_file(data_path, _SURVEY_SCHEMA) as writer:
+        if data_dict:
+            writer.write_table(
+                _survey_table(data_dict, datetime.today().strftime("%Y%m"))
+            )
 
 
 if __name__ == "__main__":
@@ -297,9 +506,11 @@ if __name__ == "__main__":
 
     for subset_ in subset:
         if args.process == "build_metadata":
-            build_metadata(subset=subset_, year_start=platform_year_start[subset_])
+            asyncio.run(
+                build_metadata(subset=subset_, year_start=platform_year_start[subset_])
+            )
         elif args.process == "download_content":
-            download_web_content(args.save_path, subset=subset_)
+            asyncio.run(download_web_content(args.save_path, subset=subset_))
         elif args.process == "parse_content":
             parse_data_content(args.save_path, subset=subset_)
         elif args.process == "generate_output":